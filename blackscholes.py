@@ -262,7 +262,8 @@ def call_iv(
     c: Union[float, NDArray[float_]],
     t: Union[float, NDArray[float_]],
     k: Union[float, NDArray[float_]],
-    iv_approx_bounds: Optional[tuple[float, float]] = None
+    iv_approx_bounds: Optional[tuple[float, float]] = None,
+    x0: Optional[Union[float, NDArray[float_]]] = None
 ) -> Union[float, NDArray[float_]]:
     """Computes the implied volatility of a call option.
 
@@ -280,6 +281,11 @@ def call_iv(
             the interval `[min, max]`. This is useful for extreme strikes or
             maturities, when the approximate formula gives unrealistic results.
             If None, no truncation will be applied.
+        x0: Initial guess of the implied volatility for Newton's method (e.g.
+            a previously computed implied volatility). If None, or where
+            Newton's method does not converge from `x0`, the guess is computed
+            by the Corrado-Miller formula and truncated according to
+            `iv_approx_bounds`.
 
     Returns:
         The implied volatility if Newton's method converged successfully;
@@ -292,20 +298,44 @@ def call_iv(
         `call_iv(s, r, c,  *vol_grid(t, k))`, where `t` and `k` are 1-D arrays
         with grid coordinates, and `c` is a 2-D of option prices.
     """
-    iva = _call_iv_approx(s, r, c, t, k)
-    if iv_approx_bounds is None:
-        x0 = iva
-    else:
-        x0 = np.minimum(np.maximum(iva, iv_approx_bounds[0]),
-                        iv_approx_bounds[1])
-    res = optimize.newton(
-        func=_call_iv_f,
-        args=(s, r, c, t, k),
-        x0=x0,
-        fprime=_call_iv_fprime,
-        full_output=True)
+    warm_start = x0 is not None
+    if x0 is None:
+        iva = _call_iv_approx(s, r, c, t, k)
+        if iv_approx_bounds is None:
+            x0 = iva
+        else:
+            x0 = np.minimum(np.maximum(iva, iv_approx_bounds[0]),
+                            iv_approx_bounds[1])
+    try:
+        res = optimize.newton(
+            func=_call_iv_f,
+            args=(s, r, c, t, k),
+            x0=x0,
+            fprime=_call_iv_fprime,
+            full_output=True)
+    except RuntimeError:
+        if not warm_start:
+            raise
+        # Newton's method has failed from the given initial guess for all
+        # elements, so it is restarted from the approximate formula
+        return call_iv(s, r, c, t, k, iv_approx_bounds)
 
     if hasattr(res, "root"):  # vector-valued arguments were supplied
-        return np.where(res.converged, res.root, np.NaN)
+        iv = np.where(res.converged, res.root, np.NaN)
     else:
-        return res[0] if res[1].converged else np.NaN
+        iv = res[0] if res[1].converged else np.NaN
+    if warm_start and np.any(np.isnan(iv)):
+        # Newton's method may not converge from the given initial guess if it
+        # is far from the implied volatility, so it is restarted from the
+        # approximate formula where it has failed
+        iv = np.array(iv)
+        failed = np.isnan(iv)
+        c, t, k = (np.broadcast_to(a, iv.shape)[failed] for a in (c, t, k))
+        try:
+            iv[failed] = call_iv(s, r, c, t, k, iv_approx_bounds)
+        except RuntimeError:
+            # Raised instead of returning NaN if all elements have failed
+            pass
+        if iv.ndim == 0:
+            return iv[()]
+    return iv
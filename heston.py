@@ -1,53 +1,454 @@
-from typing import Union
+from typing import Union, Optional
 from numpy import float_
 from numpy.typing import NDArray
-from numba.types import CPointer, float64, complex128, intc  # type: ignore
+from numba.types import float64, int64, complex128  # type: ignore
 from dataclasses import dataclass
 import math
 import cmath
 import numpy as np
 import numba                     # type: ignore
-import scipy.stats as st         # type: ignore
 import scipy.optimize as opt     # type: ignore
-import scipy.integrate as intg   # type: ignore
-import scipy.special as spec     # type: ignore
-import scipy.misc as spmisc      # type: ignore
-from scipy import LowLevelCallable
 import blackscholes
 
 
-# The following two functions are used to implement Heston's formula with Numba
+# Minimization methods of `scipy.optimize.minimize` which handle bounds and
+# use the gradient of the objective function
+_GRADIENT_METHODS = ("L-BFGS-B", "TNC", "SLSQP", "trust-constr")
+
+
+# The following functions are used to implement Heston's formula with Numba
+
+@numba.njit(complex128[:](
+    float64, float64, float64, float64, float64, float64, float64[:], float64,
+    float64), fastmath=True, error_model="numpy", cache=True)
+def _heston_cf(s, v, kappa, theta, sigma, rho, x, y, t):
+    """Characteristic function of the log-price in the Heston model evaluated
+    at the points `u = x - y*1j`, where `x` is a real array and `y` is real."""
+    res = np.empty(x.size, dtype=np.complex128)
+    sigma_sq = sigma*sigma
+    inv_sig2 = 1.0/sigma_sq
+    rho_sigma = rho*sigma
+    log_s = math.log(s)
+    for i in range(x.size):
+        # Here u*1j + u*u and other expressions of u are expanded into real
+        # and imaginary parts to avoid complex multiplications
+        xi = x[i]
+        # Stable representation from Albrecher et al. "The little Heston
+        # trap": g = (b-d)/(b+d) with exp(-d*t), so that |exp(-d*t)| <= 1
+        b = complex(kappa - rho_sigma*y, -rho_sigma*xi)
+        d = cmath.sqrt(b*b + sigma_sq*complex(y + xi*xi - y*y, xi - 2*xi*y))
+        bmd = b - d
+        g = bmd/(b + d)
+        emdt = cmath.exp(-d*t)
+        one_minus_g_emdt = 1 - g*emdt
+        C = kappa*theta*inv_sig2 * (
+            bmd*t - 2*cmath.log(one_minus_g_emdt/(1-g)))
+        D = bmd*inv_sig2 * ((1 - emdt)/one_minus_g_emdt)
+        res[i] = cmath.exp(C + D*v + complex(y*log_s, xi*log_s))
+    return res
+
+
+# Nodes and weights of the Gauss-Legendre quadrature on `[0, 1]` applied to
+# each panel of the integration over `(0, inf)` in Heston's formula
+_GL_X, _GL_W = np.polynomial.legendre.leggauss(16)
+_GL_X = 0.5*(_GL_X + 1)
+_GL_W = 0.5*_GL_W
+
+# Maximum number of panels per option (a safeguard for degenerate parameters)
+_MAX_PANELS = 1000
+
+
+@numba.njit(parallel=True, fastmath=True, error_model="numpy", cache=True)
+def _call_price_batch(ts, ks, s, v, kappa, theta, sigma, rho, r, nodes,
+                      weights):
+    """Computes call prices by Heston's formula for 1-D arrays of expiration
+    times `ts` and strikes `ks` of the same size.
+
+    The integral over `(0, inf)` is computed by the quadrature with `nodes`
+    and `weights` on `[0, 1]` applied to consecutive panels. The panels
+    resolve the oscillation of the integrand with frequency `|log(k/s)|` and
+    its decay on the scale `1/sqrt(w*t)`, where `w` is the mean expected
+    variance over `[0, t]`, and widen away from zero. The integration stops
+    once the modulus of the integrand is below `1e-14*s`.
+    """
+    prices = np.empty(ts.size)
+    for idx in numba.prange(ts.size):
+        t = ts[idx]
+        k = ks[idx]
+        log_k = math.log(k)
+        kt = kappa*t
+        w = theta + (v - theta)*((1 - math.exp(-kt))/kt if kt > 1e-8 else 1.0)
+        scale = 1/math.sqrt(max(w, 1e-4)*t)
+        freq = abs(log_k - math.log(s))
+        integral = 0.0
+        a = 0.0
+        for _ in range(_MAX_PANELS):
+            h = 1/(freq/8 + 2/(scale + a))
+            u = a + h*nodes
+            cf1 = _heston_cf(s, v, kappa, theta, sigma, rho, u, 1.0, t)
+            cf0 = _heston_cf(s, v, kappa, theta, sigma, rho, u, 0.0, t)
+            integrand = (np.exp(-1j*u*log_k)/(1j*u)*(cf1 - k*cf0)).real
+            integral += h*np.sum(weights*integrand)
+            a += h
+            if (abs(cf1[-1]) + k*abs(cf0[-1]))/a < 1e-14*s:
+                break
+        df = math.exp(-r*t)
+        price = 0.5*(s - df*k) + 1/math.pi * df * integral
+        # Rounding errors must not make the price negative or above `s`
+        prices[idx] = min(max(price, 0.0), s)
+    return prices
+
+
+# The following functions implement the time-stepping of the simulation
+# schemes. Paths are independent, so each step is parallelized over paths.
+
+@numba.njit(parallel=True, fastmath=True, error_model="numpy", cache=True)
+def _euler_kernel(V, S, Z, kappa, theta, sigma, rho, r, dt):
+    """Fills `V[1:]` and `S[1:]` by Euler's scheme given the standard normal
+    variables `Z` of shape `(2, steps, paths)`.
+
+    The Brownian increments driving the variance and the log-price are
+    obtained from `Z` on the fly. The scheme is applied to the log-price,
+    whose increments are exponentiated on the fly, so the log-price itself is
+    never stored."""
+    steps, paths = Z.shape[1:]
+    sdt = math.sqrt(dt)
+    rho_sdt = rho*sdt
+    rho_perp_sdt = math.sqrt(1-rho*rho)*sdt
+    for i in range(steps):
+        for j in numba.prange(paths):
+            Vplus = max(V[i, j], 0.0)
+            sqrtVplus = math.sqrt(Vplus)
+            V[i+1, j] = (V[i, j] + kappa*(theta-Vplus)*dt +
+                         sigma*sqrtVplus*sdt*Z[0, i, j])
+            S[i+1, j] = S[i, j]*math.exp(
+                (r-0.5*Vplus)*dt +
+                sqrtVplus*(rho_sdt*Z[0, i, j] + rho_perp_sdt*Z[1, i, j]))
+
+
+# Maximum number of paths simulated as one block in `_qe_kernel`
+_QE_BLOCK = 2048
+
+
+@numba.njit(parallel=True, fastmath=True, error_model="numpy", cache=True)
+def _qe_kernel(V, S, Z, U, block, theta, r, dt, K0, K1, K2, K3, C1, C2, C3):
+    """Fills `V[1:]` and `S[1:]` by Andersen's QE scheme given the standard
+    normal variables `Z` of shape `(2, steps, paths)` and the uniform
+    variables `U` of shape `(steps, paths)`.
+
+    Paths are processed in blocks of size `block`, each block being simulated
+    over all time steps by one thread, so that its working set stays in
+    cache."""
+    steps, paths = U.shape
+    for n in numba.prange(-(-paths // block)):
+        for i in range(steps):
+            for j in range(n*block, min(n*block + block, paths)):
+                m = V[i, j]*C1 + theta*(1-C1)
+                s_sq = V[i, j]*C2 + C3
+                psi = s_sq/(m*m)
+                if psi < 1.5:  # quadratic scheme
+                    b_sq = 2/psi - 1 + math.sqrt(max(4/(psi*psi) - 2/psi, 0.0))
+                    x = math.sqrt(b_sq) + Z[0, i, j]
+                    V[i+1, j] = m/(1+b_sq)*x*x
+                else:  # exponential scheme
+                    p = (psi-1)/(psi+1)
+                    if U[i, j] < p:
+                        V[i+1, j] = 0.0
+                    else:
+                        V[i+1, j] = math.log((1-p)/(1-U[i, j]))*m/(1-p)
+                S[i+1, j] = S[i, j]*math.exp(
+                    r*dt + K0 + K1*V[i, j] + K2*V[i+1, j] +
+                    math.sqrt(K3*(V[i, j] + V[i+1, j]))*Z[1, i, j])
+
+
+# The following functions are used in Broadie-Kaya's exact simulation scheme
+
+@numba.njit(complex128(float64, complex128), fastmath=True,
+            error_model="numpy", cache=True)
+def _log_bessel_ive(nu, z):
+    """Logarithm of the exponentially scaled modified Bessel function
+    `I_nu(z)*exp(-z)` of the first kind for real `nu > -1` and complex `z`
+    with `Re(z) >= 0`, `z != 0`.
+
+    The power series loses accuracy by cancellation for large `|z|` away
+    from the real axis."""
+    if abs(z) < max(15, nu*nu):
+        # Power series I_nu(z) = sum_k t_k, t_k = (z/2)^(nu+2k)/(k!*G(nu+k+1)).
+        # The terms are divided by the modulus of the largest one, so that
+        # they neither overflow nor underflow for large |z| or nu, and are
+        # summed from it in both directions.
+        w = 0.25*z*z
+        log_half_z = cmath.log(0.5*z)
+        k_max = int(0.5*(math.sqrt(nu*nu + 4*abs(w)) - nu))
+        log_scale = ((nu + 2*k_max)*log_half_z.real - math.lgamma(k_max+1) -
+                     math.lgamma(nu+k_max+1))
+        peak = cmath.exp(1j*(nu + 2*k_max)*log_half_z.imag)
+        res = peak
+        term = peak
+        k = k_max
+        while k > 0 and abs(term) > 1e-17*abs(res):
+            term *= k*(nu+k)/w
+            res += term
+            k -= 1
+        term = peak
+        k = k_max
+        while True:
+            k += 1
+            term *= w/(k*(nu+k))
+            res += term
+            if abs(term) <= 1e-17*abs(res):
+                break
+        return cmath.log(res) + log_scale - z
+    # Asymptotic expansion, see DLMF 10.40.5
+    mu = 4*nu*nu
+    a = 1.0 + 0j
+    s1 = a
+    s2 = a
+    sign = 1.0
+    for k in range(1, 40):
+        a_next = a*(mu - (2*k-1)*(2*k-1))/(8*k*z)
+        if abs(a_next) >= abs(a) or abs(a_next) < 1e-17:
+            break
+        a = a_next
+        sign = -sign
+        s1 += sign*a
+        s2 += a
+    res = s1
+    if z.imag != 0:
+        branch = 1 if z.imag > 0 else -1
+        res += cmath.exp(-2*z + branch*(nu+0.5)*math.pi*1j)*s2
+    return cmath.log(res) - 0.5*cmath.log(2*math.pi*z)
+
 
 @numba.njit(complex128(
-    float64, float64, float64, float64, float64, float64, complex128, float64))
-def _heston_cf(s, v, kappa, theta, sigma, rho, u, t):
-    """Characteristic function of the log-price in the Heston model."""
-    d = cmath.sqrt((rho*sigma*u*1j - kappa)**2 + sigma**2*(u*1j + u**2))
-    g = ((rho*sigma*u*1j - kappa + d) / (rho*sigma*u*1j - kappa - d))
-    C = (kappa*theta/sigma**2 * (
-        t*(kappa - rho*sigma*u*1j - d) -
-        2*cmath.log((1 - g*cmath.exp(-d*t))/(1-g))))
-    D = ((kappa - rho*sigma*u*1j - d)/sigma**2 *
-         ((1 - cmath.exp(-d*t)) / (1 - g*cmath.exp(-d*t))))
-    return cmath.exp(C + D*v + u*math.log(s)*1j)
-
-
-@numba.cfunc(float64(intc, CPointer(float64)))
-def _heston_integrand(n, x):
-    """Integrand in Heston's formula."""
-    # x = (u, t, k, s, v, kappa, theta, sigma, rho)
-    u = x[0]
-    t = x[1]
-    k = x[2]
-    s = x[3]
-    v = x[4]
-    kappa = x[5]
-    theta = x[6]
-    sigma = x[7]
-    rho = x[8]
-    return (cmath.exp(-1j*u*math.log(k))/(1j*u) *
-            (_heston_cf(s, v, kappa, theta, sigma, rho, u-1j, t) -
-             k*_heston_cf(s, v, kappa, theta, sigma, rho, u, t))).real
+    float64, float64, float64, float64, float64, float64, float64, float64),
+    fastmath=True, error_model="numpy", cache=True)
+def _bk_cf(u, vprev, vnext, dt, kappa, theta, sigma, df):
+    """Conditional characteristic function of the integrated variance
+    process used in Broadie-Kaya's scheme.
+
+    Computes
+    `phi(u) = E exp(iu*\\int_t^(t+dt) V_s ds | V_t=vprev, V_(t+dt)=vnext)`
+    """
+    nu = 0.5*df - 1
+    g = cmath.sqrt(complex(kappa*kappa, -2*sigma*sigma*u))
+    c1 = math.exp(-kappa*dt)
+    c2 = cmath.exp(-g*dt)
+    res = (g*cmath.exp(-0.5*(g-kappa)*dt)*(1 - c1) / (kappa*(1 - c2)))
+    e = ((vprev+vnext)/(sigma*sigma) *
+         (kappa*(1 + c1)/(1 - c1) - g*(1 + c2)/(1 - c2)))
+    # The ratio I_nu(z)/I_nu(z0) of the Bessel functions, where
+    # z = a*g*exp(-g*dt/2)/(1-c2), z0 = a*kappa*exp(-kappa*dt/2)/(1-c1).
+    # Since I_nu(z) = (z/2)^nu * F(z^2) with an entire function F, the factor
+    # (z/z0)^nu is computed along the continuous branch of log(z), and F is
+    # computed from I_nu at the one of +-z which lies in the right half-plane.
+    log_z_ratio = (cmath.log(g/kappa) - 0.5*(g-kappa)*dt -
+                   cmath.log((1 - c2)/(1 - c1)))
+    a = 4*math.sqrt(vprev*vnext)/(sigma*sigma)
+    if a > 0:
+        z0 = a*kappa*math.exp(-0.5*kappa*dt)/(1 - c1)
+        z = a*g*cmath.exp(-0.5*g*dt)/(1 - c2)
+        if z.real < 0:
+            z = -z
+        e += (z - z0 + nu*(log_z_ratio - cmath.log(z/z0)) +
+              _log_bessel_ive(nu, z) - _log_bessel_ive(nu, complex(z0)))
+    else:
+        e += nu*log_z_ratio
+    return res*cmath.exp(e)
+
+
+@numba.njit(numba.types.UniTuple(float64, 2)(
+    float64, float64, float64, float64, float64, float64), fastmath=True,
+    error_model="numpy", cache=True)
+def _bk_moments(vprev, vnext, dt, kappa, theta, sigma):
+    """Conditional mean and variance of the integrated variance process used
+    in Broadie-Kaya's scheme.
+
+    Computes the mean and the variance of `\\int_t^(t+dt) V_s ds` given
+    `V_t=vprev, V_(t+dt)=vnext` by analytic differentiation of the logarithm
+    of `_bk_cf` at zero.
+    """
+    # As a function of gamma = sqrt(kappa^2 - 2*sigma^2*u*1j), the log of
+    # the characteristic function is, up to a constant,
+    #   log(h) - (vprev+vnext)/sigma^2*q + log(I_nu(c*h)),
+    # where h = gamma/sinh(x), q = gamma*coth(x), x = gamma*dt/2,
+    # c = 2*sqrt(vprev*vnext)/sigma^2. Below are its derivatives with
+    # respect to gamma at gamma=kappa.
+    sigma_sq = sigma*sigma
+    nu = 2*theta*kappa/sigma_sq - 1
+    x = 0.5*kappa*dt
+    csch = 1/math.sinh(x)
+    coth = 1/math.tanh(x)
+    csch_sq = csch*csch
+    h = kappa*csch
+    h1 = (1 - x*coth)*csch
+    h2 = 0.5*dt*csch*(x*(csch_sq + coth*coth) - 2*coth)
+    q1 = coth - x*csch_sq
+    q2 = dt*csch_sq*(x*coth - 1)
+    c = 2*math.sqrt(vprev*vnext)/sigma_sq
+    l1 = h1/h  # derivatives of log(h)
+    l2 = h2/h - l1*l1
+    f1 = l1 - (vprev+vnext)/sigma_sq*q1
+    f2 = l2 - (vprev+vnext)/sigma_sq*q2
+    y = c*h
+    if y > 0:
+        # R = I_nu'(y)/I_nu(y) and its derivative
+        # The ratio of the Bessel functions is computed from their logarithms,
+        # so that it neither overflows nor underflows
+        R = math.exp((_log_bessel_ive(nu+1, complex(y)) -
+                      _log_bessel_ive(nu, complex(y))).real) + nu/y
+        R1 = 1 + nu*nu/(y*y) - R/y - R*R
+        f1 += R*c*h1
+        f2 += R1*c*c*h1*h1 + R*c*h2
+    else:
+        # I_nu(c*h) ~ (c*h/2)^nu as c -> 0
+        f1 += nu*l1
+        f2 += nu*l2
+    # Derivatives of the cumulant generating function of -\int V_s ds
+    # with respect to w = -u*1j, where gamma = sqrt(kappa^2 + 2*sigma^2*w)
+    g1 = sigma_sq/kappa
+    g2 = -g1*g1/kappa
+    return -f1*g1, f2*g1*g1 + f1*g2
+
+
+@numba.njit(float64[:](
+    float64, float64, float64, float64, float64, float64, float64, float64,
+    float64, int64), fastmath=True, error_model="numpy", cache=True)
+def _bk_cf_nodes(h, vprev, vnext, dt, kappa, theta, sigma, df,
+                 truncation_error, max_terms):
+    """Real parts of `_bk_cf(h*j, ...)`, `j = 1, 2, ...`, used in the
+    truncated series from formula (18) of Broadie and Kaya's paper.
+
+    The series is truncated at the first `j` such that
+    `|_bk_cf(h*j, ...)|/j < pi*truncation_error/2`, see formula (15), but
+    has at most `max_terms` terms.
+    """
+    res = np.empty(max_terms)
+    for j in range(1, max_terms+1):
+        cf_val = _bk_cf(h*j, vprev, vnext, dt, kappa, theta, sigma, df)
+        if abs(cf_val)/j < math.pi*truncation_error/2:
+            return res[:j-1]
+        res[j-1] = cf_val.real
+    return res
+
+
+@numba.njit(float64(float64, float64, float64[:]), fastmath=True,
+            error_model="numpy", cache=True)
+def _bk_prob(x, h, cf):
+    """Conditional distribution function of the integrated variance process
+    used in Broadie-Kaya's scheme.
+
+    Computes
+        `P(\\int_t^{t+dt} V_s ds <= x | V_t=vprev, V_{t+dt}=vnext))`
+    by formula (18) from Broadie and Kaya's paper, where `h` is the
+    discretization step and `cf` are the values computed by `_bk_cf_nodes`.
+    Since `cf` does not depend on `x`, it is computed once and reused when
+    the distribution function is inverted.
+    """
+    if x <= 0:
+        return 0.0
+    prob = h*x/math.pi
+    for j in range(1, cf.size+1):
+        prob += 2/math.pi * math.sin(h*j*x)/j * cf[j-1]
+    return max(min(prob, 1.0), 0.0)
+
+
+@numba.njit(float64(float64, float64, float64[:], float64),
+            error_model="numpy", cache=True)
+def _bk_prob_inverse(u, h, cf, b):
+    """Solves `_bk_prob(x, h, cf) = u` for `x` in `[0, b]` by Brent's method.
+
+    It is assumed that `0 < u < _bk_prob(b, h, cf)`.
+    """
+    xtol = 2e-12
+    eps = 2.220446049250313e-16
+    a = 0.0
+    fa = -u
+    fb = _bk_prob(b, h, cf) - u
+    c = b
+    fc = fb
+    d = e = b - a
+    for _ in range(100):
+        if (fb > 0 and fc > 0) or (fb < 0 and fc < 0):
+            c = a
+            fc = fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2*eps*abs(b) + 0.5*xtol
+        xm = 0.5*(c - b)
+        if abs(xm) <= tol or fb == 0:
+            break
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            # Inverse quadratic interpolation or the secant method
+            s = fb/fa
+            if a == c:
+                p = 2*xm*s
+                q = 1 - s
+            else:
+                q = fa/fc
+                r = fb/fc
+                p = s*(2*xm*q*(q - r) - (b - a)*(r - 1))
+                q = (q - 1)*(r - 1)*(s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2*p < min(3*xm*q - abs(tol*q), abs(e*q)):
+                e = d
+                d = p/q
+            else:  # Interpolation failed, use bisection
+                d = xm
+                e = d
+        else:  # Bounds decrease too slowly, use bisection
+            d = xm
+            e = d
+        a = b
+        fa = fb
+        b += d if abs(d) > tol else math.copysign(tol, xm)
+        fb = _bk_prob(b, h, cf) - u
+    return b
+
+
+# The fast-math flags exclude "nnan" and "ninf", which would let the compiler
+# drop the check of `h` below
+@numba.njit(parallel=True, fastmath={"nsz", "arcp", "contract", "afn",
+                                     "reassoc"},
+            error_model="numpy", cache=True)
+def _bk_int_v(U, vprev, vnext, dt, kappa, theta, sigma, truncation_error,
+              small_tail_stddev, max_terms):
+    """Samples the integrated variance in Broadie-Kaya's scheme for a batch
+    of paths.
+
+    For each path `j`, computes `F_j^{-1}(U[j])`, where `F_j` is the
+    conditional distribution function of the integrated variance given
+    `V_t=vprev[j], V_(t+dt)=vnext[j]` computed by `_bk_prob`.
+
+    If the conditional moments of the integrated variance are not finite,
+    the integrated variance is approximated by the trapezoidal rule.
+
+    See `simulate_exact` for the description of the parameters
+    `truncation_error`, `small_tail_stddev` and `max_terms`.
+    """
+    df = 4*theta*kappa/(sigma*sigma)
+    int_v = np.empty(U.size)
+    for j in numba.prange(U.size):
+        m, var = _bk_moments(vprev[j], vnext[j], dt, kappa, theta, sigma)
+        h = math.pi/(m + math.sqrt(max(var, 0.0))*small_tail_stddev)
+        if not (math.isfinite(h) and h > 0):
+            # The moments could not be computed, so the integrated variance
+            # is approximated by the trapezoidal rule
+            int_v[j] = 0.5*(vprev[j] + vnext[j])*dt
+            continue
+        cf = _bk_cf_nodes(h, vprev[j], vnext[j], dt, kappa, theta, sigma, df,
+                          truncation_error, max_terms)
+        # For safety, truncate the support of F at max_int_v
+        max_int_v = (vprev[j] + vnext[j])*dt*10
+        if _bk_prob(max_int_v, h, cf) <= U[j]:
+            int_v[j] = max_int_v
+        else:
+            int_v[j] = _bk_prob_inverse(U[j], h, cf, max_int_v)
+    return int_v
 
 
 @dataclass
@@ -85,20 +486,6 @@ class Heston:
     rho: float
     r: float = 0
 
-    def _call_price_scalar(self, t: float, k: float) -> float:
-        """Computes the price of a call option by Heston's semi-closed formula.
-
-        This is an auxiliary function which works with scalar expiration time
-        and strike. It is called by `call_price`, which allows vectorization.
-        """
-        return (0.5*(self.s - math.exp(-self.r*t)*k) +
-                1/math.pi * math.exp(-self.r*t) *
-                intg.quad(
-                    LowLevelCallable(_heston_integrand.ctypes),
-                    0, math.inf,
-                    args=(t, k, self.s, self.v, self.kappa, self.theta,
-                          self.sigma, self.rho))[0])
-
     def call_price(
         self,
         t: Union[float, NDArray[float_]],
@@ -116,16 +503,32 @@ class Heston:
             broadcasting rules and returns an array of prices.
 
         Notes:
-            Here we use the stable representation of the characteristic
+            1. Here we use the stable representation of the characteristic
             function, see Albrecher et al. "The little Heston trap" (2007).
+            2. The integral in the formula is computed by Gauss-Legendre
+            quadrature over panels adapted to the expiration time and strike,
+            with absolute error of order `1e-13*s`. Short expiration times
+            need more nodes: about 1500 for `t=0.005` against 100-300 for
+            `t>=1`. Prices below about `1e-10*s` (e.g. far out-of-the-money
+            options with short expiration times) are dominated by this error,
+            so their implied volatilities are unreliable. Prices are truncated
+            to `[0, s]`.
         """
         b = np.broadcast(t, k)
+        # Owned copies are passed to the kernel, since Numba must not receive
+        # the read-only views returned by `np.broadcast_arrays`
+        ts, ks = (np.array(x, dtype=float_).ravel()
+                  for x in np.broadcast_arrays(t, k))
+        # Parameters are cast to float so that integer values (e.g. the
+        # default `r=0`) do not make Numba compile another specialization
+        prices = _call_price_batch(
+            ts, ks, *map(float, (self.s, self.v, self.kappa, self.theta,
+                                 self.sigma, self.rho, self.r)),
+            _GL_X, _GL_W)
         if b.nd:  # Vector arguments were supplied
-            return np.fromiter(
-                (self._call_price_scalar(t_, k_) for (t_, k_) in b),
-                count=b.size, dtype=float_).reshape(b.shape)
+            return prices.reshape(b.shape)
         else:
-            return self._call_price_scalar(t, k)
+            return prices[0]
 
     def iv(
         self,
@@ -190,12 +593,57 @@ class Heston:
             only `cls`.
         """
         v0 = iv[np.abs(k-s).argmin()]**2  # ATM variance
+
+        bounds = [(0, math.inf), (0, math.inf), (0, math.inf), (0, math.inf),
+                  (-1, 1)]
+
+        def model_iv(*params):
+            # Prices for all parameter sets are inverted by one call of
+            # Newton's method. Market implied volatilities are used as the
+            # initial guess, since model ones are close to them near the
+            # optimum and Newton's method then needs fewer iterations;
+            # `call_iv` restarts from its own guess where this one fails, so
+            # the result is NaN only where the model price cannot be inverted.
+            # Parameters which are not finite (an optimizer may try them after
+            # a NaN objective value) give NaN without calling the pricer.
+            c = np.stack([Heston(s, *p, r).call_price(t, k)
+                          if np.all(np.isfinite(p))
+                          else np.full(np.shape(iv), np.NaN)
+                          for p in params])
+            return blackscholes.call_iv(
+                s, r, c, t, k, x0=np.broadcast_to(iv, c.shape).copy())
+
+        # The last point where the objective function was evaluated and its
+        # value (the optimizer computes the gradient at the same point next)
+        last: dict = {}
+
+        def fun(p):
+            last["p"] = p.copy()
+            last["f"] = np.linalg.norm(model_iv(p)[0] - iv)
+            return last["f"]
+
+        def jac(p):
+            # Forward differences with all shifted points evaluated together;
+            # step backward if a forward step leaves the bounds
+            h = np.sqrt(np.finfo(float_).eps)*np.maximum(1, np.abs(p))
+            h = np.where(p + h > [b[1] for b in bounds], -h, h)
+            shifted = p + np.diag(h)
+            if "p" in last and np.array_equal(last["p"], p):
+                f0 = last["f"]
+                d = model_iv(*shifted) - iv
+            else:
+                d = model_iv(p, *shifted) - iv
+                f0 = np.linalg.norm(d[0])
+                d = d[1:]
+            f = np.linalg.norm(d.reshape(len(p), -1), axis=1)
+            return (f - f0)/h
+
         res = opt.minimize(
-            fun=lambda p: np.linalg.norm(Heston(s, *p, r).iv(t, k) - iv),
+            fun=fun,
+            jac=jac if min_method in _GRADIENT_METHODS else None,
             x0=(v0, 1.0, v0, 1.0, -0.5),  # (v, kappa, theta, sigma, rho)
             method=min_method,
-            bounds=[(0, math.inf), (0, math.inf), (0, math.inf), (0, math.inf),
-                    (-1, 1)])
+            bounds=bounds)
         ret = cls(s=s, v=res.x[0], kappa=res.x[1], theta=res.x[2],
                   sigma=res.x[3], rho=res.x[4], r=r)
         if return_minimize_result:
@@ -208,7 +656,8 @@ class Heston:
         t: float,
         steps: int,
         paths: int,
-        return_v: bool = False
+        return_v: bool = False,
+        rng: Optional[np.random.Generator] = None
     ) -> Union[np.ndarray, tuple[np.ndarray, np.ndarray]]:
         """Simulates paths using Euler's scheme.
 
@@ -218,6 +667,10 @@ class Heston:
                 at `t_i = i*dt`, where `i = 0, ..., steps`, `dt = t/steps`.
             paths: Number of paths to simulate.
             return_v : If True, returns both price and variance processes.
+            rng: Random number generator. If None, a new generator is created
+                by `np.random.default_rng()`, which is not affected by
+                `np.random.seed`; to reproduce paths, pass a seeded generator,
+                e.g. `np.random.default_rng(0)`.
 
         Returns:
             If `return_v` is False, returns an array `s` of shape
@@ -232,29 +685,22 @@ class Heston:
             1. Euler's scheme is the fastest but least precise simulation
             method.
             2. Paths of the price process are obtained by simulation of the
-            log-price and exponentiation.
+            log-price and exponentiation of its increments.
             3. Negative values of the variance process are truncated, i.e. the
             coefficients of the SDEs for the log-price and the variance
             processes contain V_t^+.
         """
+        if rng is None:
+            rng = np.random.default_rng()
         dt = t/steps
-        Z = st.norm.rvs(size=(2, steps, paths))
+        Z = rng.standard_normal(size=(2, steps, paths))
         V = np.empty(shape=(steps+1, paths))
-        X = np.empty_like(V)
+        S = np.empty_like(V)
         V[0] = self.v
-        X[0] = math.log(self.s)
+        S[0] = self.s
 
-        for i in range(steps):
-            Vplus = np.maximum(V[i], 0)
-            V[i+1] = (
-                V[i] + self.kappa*(self.theta-Vplus)*dt +
-                self.sigma*np.sqrt(Vplus) * Z[0, i]*math.sqrt(dt))
-            X[i+1] = (
-                X[i] + (self.r-0.5*Vplus)*dt +
-                np.sqrt(Vplus)*(
-                    self.rho*Z[0, i] +
-                    math.sqrt(1-self.rho**2)*Z[1, i])*math.sqrt(dt))
-        S = np.exp(X)
+        _euler_kernel(V, S, Z, *map(float, (
+            self.kappa, self.theta, self.sigma, self.rho, self.r, dt)))
         if return_v:
             return S, V
         else:
@@ -265,7 +711,8 @@ class Heston:
         t: float,
         steps: int,
         paths: int,
-        return_v: bool = False
+        return_v: bool = False,
+        rng: Optional[np.random.Generator] = None
     ) -> Union[np.ndarray, tuple[np.ndarray, np.ndarray]]:
         """Simulates paths using Andersen's QE scheme.
 
@@ -276,6 +723,8 @@ class Heston:
             trade-off between simulation error and speed. This realization does
             not use the martingale correction (see Andersen's paper).
         """
+        if rng is None:
+            rng = np.random.default_rng()
         dt = t/steps
         K0 = -self.rho*self.kappa*self.theta*dt/self.sigma
         K1 = 0.5*(self.kappa*self.rho/self.sigma-0.5)*dt - self.rho/self.sigma
@@ -284,101 +733,22 @@ class Heston:
         C1 = math.exp(-self.kappa*dt)
         C2 = self.sigma**2*C1*(1-C1)/self.kappa
         C3 = 0.5*self.theta*self.sigma**2*(1-C1)**2/self.kappa
-        Z = st.norm.rvs(size=(2, steps, paths))
-        U = st.uniform.rvs(size=(steps, paths))
+        Z = rng.standard_normal(size=(2, steps, paths))
+        U = rng.random(size=(steps, paths))
         V = np.empty(shape=(steps+1, paths))
         S = np.empty_like(V)
         V[0] = self.v
         S[0] = self.s
 
-        for i in range(steps):
-            m = V[i]*C1 + self.theta*(1-C1)
-            s_sq = V[i]*C2 + C3
-            psi = s_sq/m**2
-            b_sq = np.where(
-                psi < 2,
-                2/psi - 1 + np.sqrt(np.maximum(4/psi**2 - 2/psi, 0)), 0)
-            a = m/(1+b_sq)
-            p = np.where(psi > 1, (psi-1)/(psi+1), 0)
-            beta = (1-p)/m
-            V[i+1] = np.where(psi < 1.5,
-                              a*(np.sqrt(b_sq)+Z[0, i])**2,
-                              np.where(U[i] < p,
-                                       0,
-                                       np.log((1-p)/(1-U[i]))/beta))
-            S[i+1] = S[i]*np.exp(
-                self.r*dt + K0 + K1*V[i] + K2*V[i+1] +
-                np.sqrt(K3*(V[i] + V[i+1]))*Z[1, i])
+        # Use smaller blocks if there are not enough of them for all threads
+        block = max(1, min(_QE_BLOCK, -(-paths // numba.get_num_threads())))
+        _qe_kernel(V, S, Z, U, block, *map(float, (
+            self.theta, self.r, dt, K0, K1, K2, K3, C1, C2, C3)))
         if return_v:
             return S, V
         else:
             return S
 
-    def _bk_cf(
-        self,
-        u: float,
-        vprev: float,
-        vnext: float,
-        dt: float
-    ) -> complex:
-        """Conditional characteristic function of the integrated variance
-        process used in Broadie-Kaya's scheme.
-
-        Computes
-        `phi(u) = E exp(iu*\\int_t^(t+dt) V_s ds | V_t=vprev, V_(t+dt)=vnext)`
-        """
-        g = cmath.sqrt(self.kappa**2 - 2*self.sigma**2*u*1j)
-        df = 4*self.theta*self.kappa/self.sigma**2
-        c1 = math.exp(-self.kappa*dt)
-        c2 = cmath.exp(-g*dt)
-        return (
-            g*cmath.sqrt(c2/c1)*(1 - c1) / (self.kappa*(1 - c2)) *
-            cmath.exp((vprev+vnext) / self.sigma**2 *
-                      (self.kappa*(1 + c1)/(1 - c1) - g*(1 + c2)/(1 - c2))) *
-            spec.iv(0.5*df - 1,
-                    cmath.sqrt(vprev*vnext*c2)*4*g/(self.sigma**2*(1 - c2))) /
-            spec.iv(0.5*df - 1,
-                    math.sqrt(vprev*vnext*c1)*4*self.kappa /
-                    (self.sigma**2*(1 - c1))))
-
-    def _bk_prob(
-        self, x: float,
-        vprev: float,
-        vnext: float,
-        dt: float,
-        truncation_error: float,
-        small_tail_stddev: float
-    ) -> float:
-        """Conditional distribution function of the integrated variance process
-        used in Broadie-Kaya's scheme.
-
-        Computes
-            `P(\\int_t^{t+dt} V_s ds <= x | V_t=vprev, V_{t+dt}=vnext))`
-        by formula (18) from Broadie and Kaya's paper.
-
-        See `simulate_exact` for the description of the parameters
-        `truncation_error` and `small_tail_stddev`.
-        """
-        if (x <= 0):
-            return 0
-        m = (spmisc.derivative(lambda u: self._bk_cf(u, vprev, vnext, dt), 0,
-                               dx=0.001, n=1)/1j).real
-        s = math.sqrt(max(
-            0, -(spmisc.derivative(lambda u: self._bk_cf(u, vprev, vnext, dt),
-                                   0, dx=0.001, n=2)).real))
-        h = math.pi/(m + s*small_tail_stddev)
-        prob = h*x/math.pi
-        j = 1
-
-        # TODO Use a user-specified parameter rather than 1000
-        while (j < 1000 and
-               cmath.abs(self._bk_cf(h*j, vprev, vnext, dt))/j
-               >= math.pi*truncation_error/2):
-            prob += (2/math.pi * math.sin(h*j*x)/j *
-                     self._bk_cf(h*j, vprev, vnext, dt).real)
-            j += 1
-        return max(min(prob, 1), 0)
-
     def simulate_exact(
         self,
         t: float,
@@ -386,12 +756,14 @@ class Heston:
         paths: int,
         truncation_error: float = 1e-5,
         small_tail_stddev: float = 5,
-        return_v: bool = False
+        max_terms: int = 1000,
+        return_v: bool = False,
+        rng: Optional[np.random.Generator] = None
     ) -> Union[np.ndarray, tuple[np.ndarray, np.ndarray]]:
         """Simulates paths using the exact scheme of Broadie and Kaya.
 
         See `simulate_euler` for description of arguments and return values, in
-        addition to the following two args.
+        addition to the following args.
 
         Args:
             truncation_error: Acceptable error in computation of the
@@ -399,6 +771,10 @@ class Heston:
             small_tail_stddev : Number of standard deviations from the mean to
                 assume that the tail of the probability distribution function
                 of the integrated variance is smaller than truncation_error.
+            max_terms: Maximum number of terms of the series which gives the
+                probability distribution function of the integrated variance.
+                The series is truncated there even if the accuracy
+                `truncation_error` has not been reached.
 
         Notes:
             1. This is the slowest method, but it exactly reproduces the
@@ -412,51 +788,41 @@ class Heston:
             3. The value of `u_epsilon` from the paper (see (17)) is selected
             as `m + small_tail_stddev*sigma`, where `m` and `sigma` are the
             mean and standard deviation of `\\int_{t_i}^{t_{i+1}} V_s ds`,
-            which are estimated by numerically differentiating the
+            which are computed by analytically differentiating the
             characteristic function.
         """
-
+        if rng is None:
+            rng = np.random.default_rng()
         dt = t/steps
+        ekdt = math.exp(-self.kappa*dt)
+        one_minus_ekdt = 1 - ekdt
         df = 4*self.theta*self.kappa/self.sigma**2
-        nc = (4*self.kappa*math.exp(-self.kappa*dt) /
-              (self.sigma**2*(1-math.exp(-self.kappa*dt))))
-        Z = st.norm.rvs(size=(steps, paths))
+        nc = 4*self.kappa*ekdt/(self.sigma**2*one_minus_ekdt)
+        v_scale = self.sigma**2*one_minus_ekdt/(4*self.kappa)
+        sqrt1mrho2 = math.sqrt(1 - self.rho**2)
+        Z = rng.standard_normal(size=(steps, paths))
         # Multiplication by 0.9999 is done to avoid values too close to 1,
         # which will cause problems with inversion of the distribution function
-        U = st.uniform.rvs(size=(steps, paths))*0.9999
+        U = rng.random(size=(steps, paths))*0.9999
         S = np.empty(shape=(steps+1, paths))
         V = np.empty_like(S)
-        int_v = np.empty(paths)  # stores integrated variance at current step
         S[0] = self.s
         V[0] = self.v
 
         for i in range(steps):
-            V[i+1] = (
-                self.sigma**2*(1-math.exp(-self.kappa*dt))/(4*self.kappa) *
-                st.ncx2(df=df, nc=nc*V[i]).rvs(size=paths))
-            for j in range(paths):
-                # Trying to find F^{-1}(U) where F is the conditional
-                # distribution of the integrated variance.
-                # For safety, truncate the support of F at max_int_v
-                max_int_v = (V[i, j] + V[i+1, j])*dt*10
-                if self._bk_prob(
-                        max_int_v, V[i, j], V[i+1, j], dt,
-                        truncation_error, small_tail_stddev) <= U[i, j]:
-                    int_v[j] = max_int_v
-                else:
-                    int_v[j] = opt.brentq(
-                        lambda x: self._bk_prob(
-                            x, V[i, j], V[i+1, j], dt, truncation_error,
-                            small_tail_stddev) - U[i, j],
-                        a=0, b=max_int_v)
+            V[i+1] = v_scale*rng.noncentral_chisquare(
+                df=df, nonc=nc*V[i], size=paths)
+            int_v = _bk_int_v(U[i], V[i], V[i+1], *map(float, (
+                dt, self.kappa, self.theta, self.sigma, truncation_error,
+                small_tail_stddev)), int(max_terms))
             # The two stochastic integrals
             int_w1 = (V[i+1]-V[i] - self.kappa*self.theta*dt +
                       self.kappa*int_v) / self.sigma
-            int_w2 = Z[i]*math.sqrt(int_v)
+            int_w2 = Z[i]*np.sqrt(int_v)
 
-            S[i+1] = S[i]*math.exp(
+            S[i+1] = S[i]*np.exp(
                 self.r*dt - 0.5*int_v + self.rho*int_w1 +
-                math.sqrt(1-self.rho**2)*int_w2)
+                sqrt1mrho2*int_w2)
 
         if return_v:
             return S, V